@@ -417,7 +417,24 @@ class Graph(object):
         """
         return self.apply_tensor(lambda x: x.contiguous(), *keys)
 
-    def to(self, device, *keys):
+    def pin_memory(self, *keys):
+        r"""
+        Copies the attributes specified by :obj:`*keys` into page-locked
+        memory. If :obj:`*keys` is not given, all present attributes
+        are pinned. This method is called by
+        :class:`torch.utils.data.DataLoader` when `pin_memory=True`.
+
+        Args:
+            *keys (str, optional): Tensor attributes which will be
+                copied into pinned memory.
+
+        Returns:
+            :class:`Graph`: :class:`Graph` object with specified tensor
+            attributes in pinned memory.
+        """
+        return self.apply_tensor(lambda x: x.pin_memory(), *keys)
+
+    def to(self, device, *keys, non_blocking: bool = False):
         r"""
         Transfers tensor to specified device for to all attributes that 
         are specified in the :obj:`*keys`.
@@ -429,8 +446,13 @@ class Graph(object):
                 `cuda`.
             *keys (str, optional): Tensor attributes that will be 
                 transferred to specified device.
+            non_blocking (bool): Whether to copy asynchronously with 
+                respect to the host when the tensors are in pinned 
+                memory. Default is `False`.
         """
-        return self.apply_tensor(lambda x: x.to(device), *keys)
+        return self.apply_tensor(
+            lambda x: x.to(device, non_blocking=non_blocking), *keys
+        )
 
     def clone(self):
         r"""
@@ -6,7 +6,7 @@ import torch.nn as nn
 
 from torch import Tensor
 from torch_geometric.nn.inits import reset
-from torch_sparse import matmul
+from torch_sparse import SparseTensor, matmul
 from typing import (
     List,
     Dict,
@@ -30,9 +30,15 @@ class HeteroSAGEConv(pyg_nn.MessagePassing):
             Default is `None` where the `in_channels_self` is equal to `in_channels_neigh`.
         remove_self_loop (bool): Whether to remove self loops using :class:`torch_geometric.utils.remove_self_loops`.
             Default is `True`.
+        aggr (str): The neighbor aggregation scheme, such as `add` or `mean`. If it is set, 
+            it is used by both the `edge_index` path and the fused :class:`torch_sparse.SparseTensor` 
+            path. Default is `None` where `edge_index` inputs are summed and 
+            :class:`torch_sparse.SparseTensor` inputs are averaged.
     """
-    def __init__(self, in_channels_neigh, out_channels, in_channels_self=None, remove_self_loop=True):
-        super(HeteroSAGEConv, self).__init__(aggr="add")
+    def __init__(self, in_channels_neigh, out_channels, in_channels_self=None, remove_self_loop=True, aggr=None):
+        super(HeteroSAGEConv, self).__init__(aggr="add" if aggr is None else aggr)
+        # keep the legacy mean reduction of the fused path unless aggr is given
+        self.sparse_aggr = "mean" if aggr is None else aggr
         self.remove_self_loop = remove_self_loop
         self.in_channels_neigh = in_channels_neigh
         if in_channels_self is None:
@@ -56,7 +62,10 @@ class HeteroSAGEConv(pyg_nn.MessagePassing):
         r"""
         """
         if self.remove_self_loop:
-            edge_index, _ = pyg_utils.remove_self_loops(edge_index)
+            if isinstance(edge_index, SparseTensor):
+                edge_index = edge_index.remove_diag()
+            else:
+                edge_index, _ = pyg_utils.remove_self_loops(edge_index)
         return self.propagate(
             edge_index, size=size,
             node_feature_neigh=node_feature_neigh,
@@ -74,14 +83,17 @@ class HeteroSAGEConv(pyg_nn.MessagePassing):
     def message_and_aggregate(self, edge_index, node_feature_neigh):
         r"""
         This function basically fuses the :meth:`message` and :meth:`aggregate` into 
-        one function. It will save memory and avoid message materialization. More 
-        information please refer to the PyTorch Geometric documentation.
+        one function. It will save memory and avoid message materialization. The 
+        neighbors are reduced with a CSR segment reduction, which uses the same 
+        `aggr` as the `edge_index` path when `aggr` is given. More information 
+        please refer to the PyTorch Geometric documentation.
 
         Args:
-            edge_index (:class:`torch_sparse.SparseTensor`): The `edge_index` sparse tensor.
+            edge_index (:class:`torch_sparse.SparseTensor`): The transposed adjacency 
+                sparse tensor, where rows are the self nodes and columns are the neighbors.
             node_feature_neigh (:class:`torch.Tensor`): Neighbor feature tensor.
         """
-        out = matmul(edge_index, node_feature_neigh, reduce="mean")
+        out = matmul(edge_index, node_feature_neigh, reduce=self.sparse_aggr)
         return out
 
     def update(self, aggr_out, node_feature_self, res_n_id):
@@ -141,7 +153,8 @@ class HeteroConv(torch.nn.Module):
             node_features (Dict[str, Tensor]): A dictionary each key is node type and the corresponding
                 value is a node feature tensor.
             edge_indices (Dict[str, Tensor]): A dictionary each key is message type and the corresponding
-                value is an `edge _ndex` tensor.
+                value is an `edge _ndex` tensor or a transposed adjacency 
+                :class:`torch_sparse.SparseTensor`.
             edge_features (Dict[str, Tensor]): A dictionary each key is edge type and the corresponding
                 value is an edge feature tensor. The default value is `None`.
         """
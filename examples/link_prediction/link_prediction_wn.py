@@ -226,12 +226,7 @@ def main():
     )
 
     # find num edge types
-    max_label = 0
-    labels = []
-    for u, v, edge_key in WN_graph.edges:
-        l = WN_graph[u][v][edge_key]['e_label']
-        if not l in labels:
-            labels.append(l)
+    labels = set(int(l) for _, _, l in WN_graph.edges(data='e_label'))
     # labels are consecutive (0-17)
     num_edge_types = len(labels)
 
@@ -1,19 +1,19 @@
 import argparse
-import copy
+import contextlib
+import os
 import time
 
-import numpy as np
 import networkx as nx 
 import sklearn.metrics as metrics
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.utils.data import DataLoader
 
 from torch_geometric.datasets import Planetoid
 from torch_geometric.datasets import TUDataset
 import torch_geometric.transforms as T
 import torch_geometric.nn as pyg_nn
+from torch_sparse import SparseTensor
 
 from deepsnap.hetero_graph import HeteroGraph
 from deepsnap.dataset import GraphDataset
@@ -32,8 +32,10 @@ def generate_2convs_link_pred_layers(hete, conv, hidden_size):
         s_type = message_type[2]
         n_feat_dim = hete.num_node_features(n_type)
         s_feat_dim = hete.num_node_features(s_type)
-        convs1[message_type] = conv(n_feat_dim, hidden_size, s_feat_dim)
-        convs2[message_type] = conv(hidden_size, hidden_size, hidden_size)
+        # Self loops are already dropped from the sparse adjacency, and the
+        # sparse path sums the neighbors like the edge_index path did
+        convs1[message_type] = conv(n_feat_dim, hidden_size, s_feat_dim, remove_self_loop=False, aggr="add")
+        convs2[message_type] = conv(hidden_size, hidden_size, hidden_size, remove_self_loop=False, aggr="add")
     return convs1, convs2
 
 def arg_parse():
@@ -54,6 +56,10 @@ def arg_parse():
                         help='The learning rate.')
     parser.add_argument('--weight_decay', type=float,
                         help='Weight decay.')
+    parser.add_argument('--compile', action='store_true',
+                        help='Compile the model with torch.compile (PyTorch 2.0+).')
+    parser.add_argument('--amp', action='store_true',
+                        help='Train with bfloat16 autocast (CUDA only).')
 
     parser.set_defaults(
             device='cuda:0',
@@ -68,16 +74,65 @@ def arg_parse():
     return parser.parse_args()
 
 
-def WN_transform(G, num_edge_types, input_dim=5):
-    H = nx.MultiDiGraph()
-    for node in G.nodes():
-        H.add_node(node, node_type='n1', node_feature=torch.ones(input_dim))
-    for u, v, edge_key in G.edges:
-        l = G[u][v][edge_key]['e_label']
-        e_feat = torch.zeros(num_edge_types)
-        e_feat[l] = 1.
-        H.add_edge(u, v, edge_feature=e_feat, edge_type=str(l.item()))
-    return H
+def load_WN(data_path):
+    # Parse the NetworkX pickle into (src, dst, label) tensors once and cache
+    # them next to it, so that later runs skip NetworkX entirely. The cache
+    # records the pickle's mtime and size and is rebuilt when they change.
+    cache_path = os.path.splitext(data_path)[0] + '.pt'
+    stat = os.stat(data_path)
+    source = {'mtime': stat.st_mtime, 'size': stat.st_size}
+    if os.path.exists(cache_path):
+        data = torch.load(cache_path)
+        if data.get('source') == source:
+            return data
+
+    G = nx.read_gpickle(data_path)
+    print(G.number_of_edges())
+    print('Each node has node ID (n_id). Example: ', G.nodes[0])
+    print('Each edge has edge ID (id) and categorical label (e_label). Example: ', G[0][5871])
+
+    node_index = {node: i for i, node in enumerate(G.nodes())}
+    us, vs, ls = [], [], []
+    for u, v, l in G.edges(data='e_label'):
+        us.append(node_index[u])
+        vs.append(node_index[v])
+        ls.append(int(l))
+    data = {
+        'src': torch.tensor(us, dtype=torch.long),
+        'dst': torch.tensor(vs, dtype=torch.long),
+        'label': torch.tensor(ls, dtype=torch.long),
+        'n_nodes': len(node_index),
+        'source': source,
+    }
+    try:
+        torch.save(data, cache_path)
+    except OSError:
+        print('Cannot write cache {}, continuing without it.'.format(cache_path))
+    return data
+
+
+def WN_transform(data, num_edge_types, input_dim=5):
+    edge_index = torch.stack([data['src'], data['dst']])
+    labels = data['label']
+    edge_feature = F.one_hot(labels, num_classes=num_edge_types).float()
+
+    # One message type per relation, with just one node type "n1"
+    edge_indices = {}
+    edge_features = {}
+    for l in range(num_edge_types):
+        mask = labels == l
+        if not mask.any():
+            continue
+        message_type = ('n1', str(l), 'n1')
+        edge_indices[message_type] = edge_index[:, mask]
+        edge_features[message_type] = edge_feature[mask]
+
+    return HeteroGraph(
+        edge_index=edge_indices,
+        edge_feature=edge_features,
+        node_feature={'n1': torch.ones(data['n_nodes'], input_dim)},
+        directed=True
+    )
 
 
 class HeteroGNN(torch.nn.Module):
@@ -86,95 +141,177 @@ class HeteroGNN(torch.nn.Module):
         
         self.convs1 = HeteroConv(conv1) # Wrap the heterogeneous GNN layers
         self.convs2 = HeteroConv(conv2)
+        # Fixed iteration order of the message types to predict
+        self.message_types = tuple(hetero.message_types)
         self.loss_fn = torch.nn.BCEWithLogitsLoss()
         self.bns1 = nn.ModuleDict()
         self.bns2 = nn.ModuleDict()
-        self.relus1 = nn.ModuleDict()
-        self.relus2 = nn.ModuleDict()
-        self.post_mps = nn.ModuleDict()
 
         for node_type in hetero.node_types:
             self.bns1[node_type] = torch.nn.BatchNorm1d(hidden_size)
             self.bns2[node_type] = torch.nn.BatchNorm1d(hidden_size)
-            self.relus1[node_type] = nn.LeakyReLU()
-            self.relus2[node_type] = nn.LeakyReLU()
+
+        # With a single node type (just "n1" in WN18) the embeddings are
+        # kept as bare tensors and only wrapped into dicts for the convs
+        self.node_type = None
+        if len(hetero.node_types) == 1:
+            self.node_type = hetero.node_types[0]
 
     def forward(self, data):
         x = data.node_feature
         edge_index = data.edge_index
-        x = self.convs1(x, edge_index)
-        x = forward_op(x, self.bns1)
-        x = forward_op(x, self.relus1)
-        x = self.convs2(x, edge_index)
-        x = forward_op(x, self.bns2)
-
-        pred = {}
-        for message_type in data.edge_label_index:
-            nodes_first = torch.index_select(x['n1'], 0, data.edge_label_index[message_type][0,:].long())
-            nodes_second = torch.index_select(x['n1'], 0, data.edge_label_index[message_type][1,:].long())
-            pred[message_type] = torch.sum(nodes_first * nodes_second, dim=-1)
-        return pred
+        if self.node_type is not None:
+            node_type = self.node_type
+            emb = self.convs1(x, edge_index)[node_type]
+            emb = F.leaky_relu(self.bns1[node_type](emb))
+            emb = self.convs2({node_type: emb}, edge_index)[node_type]
+            emb = self.bns2[node_type](emb)
+        else:
+            x = self.convs1(x, edge_index)
+            x = forward_op(x, self.bns1)
+            x = {node_type: F.leaky_relu(emb) for node_type, emb in x.items()}
+            x = self.convs2(x, edge_index)
+            x = forward_op(x, self.bns2)
+            emb = x['n1']
+
+        # Score the supervision edges of all message types with one gather
+        # and split the scores back per message type afterwards
+        # A split may have no supervision edges for some rare relations
+        message_types = [
+            message_type for message_type in self.message_types
+            if message_type in data.edge_label_index
+        ]
+        edge_label_index = [data.edge_label_index[message_type] for message_type in message_types]
+        src = torch.cat([index[0, :] for index in edge_label_index])
+        dst = torch.cat([index[1, :] for index in edge_label_index])
+        sizes = [index.size(1) for index in edge_label_index]
+        nodes_first = torch.index_select(emb, 0, src)
+        nodes_second = torch.index_select(emb, 0, dst)
+        scores = torch.sum(nodes_first * nodes_second, dim=-1)
+        return dict(zip(message_types, scores.split(sizes)))
 
     def loss(self, pred, y):
         loss = 0
         for key in pred:
-            p = torch.sigmoid(pred[key])
-            loss += self.loss_fn(p, y[key].type(pred[key].dtype))
+            # BCEWithLogitsLoss applies the sigmoid itself
+            loss += self.loss_fn(pred[key], y[key].type(pred[key].dtype))
         return loss
 
 
-def train(model, dataloaders, optimizer, args):
+def sparse_adj(graph, device):
+    # Transposed CSR adjacency per message type (rows are the destination
+    # nodes), so HeteroSAGEConv aggregates with a single sparse matmul
+    # instead of gathering and scattering one message per edge. The edges
+    # are sorted by destination here, once per split, since the random
+    # split does not preserve any order given at load time.
+    adjs = {}
+    for message_type, edge_index in graph.edge_index.items():
+        src_type, _, dst_type = message_type
+        edge_index = edge_index.long()
+        adj = SparseTensor(
+            row=edge_index[1], col=edge_index[0],
+            sparse_sizes=(
+                graph.node_feature[dst_type].size(0),
+                graph.node_feature[src_type].size(0)
+            )
+        )
+        adjs[message_type] = adj.remove_diag().to(device)
+    return adjs
+
+
+def collate_split(dataset, adj, device):
+    batch = Batch.collate()([dataset[0]])
+    # The message passing edges of a split never change, so they are
+    # replaced by the adjacency built once for the split
+    batch.edge_index = adj
+    # Cast the supervision edges once here instead of on every forward
+    batch.apply_tensor(lambda x: x.long().contiguous(), 'edge_label_index')
+    # Boolean labels for the accuracy, cast once per collated split
+    batch.edge_label_bool = {
+        key: label.bool() for key, label in batch.edge_label.items()
+    }
+    # pinned batches let the host to device copy run asynchronously
+    if torch.device(device).type == 'cuda':
+        batch.pin_memory()
+    return batch.to(device, non_blocking=True)
+
+
+def train(model, dataset_train, train_adj, batches, optimizer, args):
     val_max = 0
-    best_model = model
+    best_state = None
     t_accu = []
     v_accu = []
     e_accu = []
+    amp = args.amp and torch.device(args.device).type == 'cuda'
     for epoch in range(1, args.epochs + 1):
-        for iter_i, batch in enumerate(dataloaders['train']):
-            batch.to(args.device)
-            model.train()
-            optimizer.zero_grad()
+        # The train split holds a single graph whose negative edges are
+        # resampled on every access, so collate it directly each epoch
+        batch = collate_split(dataset_train, train_adj, args.device)
+        model.train()
+        optimizer.zero_grad(set_to_none=True)
+        # bfloat16 keeps the float32 exponent range and the loss itself is
+        # autocast to float32, so no gradient scaling is needed.
+        # torch.autocast only exists from PyTorch 1.10, so it is only
+        # touched when --amp is given.
+        if amp:
+            autocast = torch.autocast(device_type='cuda', dtype=torch.bfloat16)
+        else:
+            autocast = contextlib.nullcontext()
+        with autocast:
             pred = model(batch)
             loss = model.loss(pred, batch.edge_label)
-            loss.backward()
-            optimizer.step()
-
-            log = 'Epoch: {:03d}, Train loss: {:.4f}, Train: {:.4f}, Val: {:.4f}, Test: {:.4f}'
-            accs = test(model, dataloaders, args)
-            t_accu.append(accs['train'])
-            v_accu.append(accs['val'])
-            e_accu.append(accs['test'])
-
-            print(log.format(epoch, loss.item(), accs['train'], accs['val'], accs['test']))
-            if val_max < accs['val']:
-                val_max = accs['val']
-                best_model = copy.deepcopy(model)
-
+        loss.backward()
+        optimizer.step()
+
+        log = 'Epoch: {:03d}, Train loss: {:.4f}, Train: {:.4f}, Val: {:.4f}, Test: {:.4f}'
+        accs = test(model, dict(batches, train=batch), args)
+        t_accu.append(accs['train'])
+        v_accu.append(accs['val'])
+        e_accu.append(accs['test'])
+
+        print(log.format(epoch, loss.item(), accs['train'], accs['val'], accs['test']))
+        if val_max < accs['val']:
+            val_max = accs['val']
+            # a flat copy of the parameters is much cheaper than deepcopying
+            # the module, and keeping it on CPU leaves device memory free
+            best_state = {
+                k: v.detach().cpu().clone()
+                for k, v in model.state_dict().items()
+            }
+
+    if best_state is not None:
+        model.load_state_dict(best_state)
     log = 'Best: Train: {:.4f}, Val: {:.4f}, Test: {:.4f}'
-    accs = test(best_model, dataloaders, args)
+    batch = collate_split(dataset_train, train_adj, args.device)
+    accs = test(model, dict(batches, train=batch), args)
     print(log.format(accs['train'], accs['val'], accs['test']))
 
     return t_accu, v_accu, e_accu
 
 
-def test(model, dataloaders, args):
+def test(model, batches, args):
     model.eval()
-    accs = {}
-    for mode, dataloader in dataloaders.items():
-        acc = 0
-        for i, batch in enumerate(dataloader):
-            num = 0
-            batch.to(args.device)
+    corrects = []
+    nums = []
+    for mode, batch in batches.items():
+        # keep the running count on device, all splits are synced at once
+        acc = torch.zeros((), dtype=torch.long, device=args.device)
+        num = 0
+        # no autograd graph is needed for evaluation
+        with torch.no_grad():
             pred = model(batch)
-            for key in pred:
-                p = torch.sigmoid(pred[key]).cpu().detach().numpy()
-                pred_label = np.zeros_like(p, dtype=np.int64)
-                pred_label[np.where(p > 0.5)[0]] = 1
-                pred_label[np.where(p <= 0.5)[0]] = 0
-                acc += np.sum(pred_label == batch.edge_label[key].cpu().numpy())
-                num += len(pred_label)
-        accs[mode] = acc / num
-    return accs
+        for key in pred:
+            # sigmoid(p) > 0.5 is equivalent to p > 0 on the logits
+            pred_label = pred[key] > 0
+            acc += (pred_label == batch.edge_label_bool[key]).sum()
+            num += pred_label.numel()
+        corrects.append(acc)
+        nums.append(num)
+    corrects = torch.stack(corrects).tolist()
+    return {
+        mode: correct / num
+        for mode, correct, num in zip(batches, corrects, nums)
+    }
 
 
 def main():
@@ -183,38 +320,14 @@ def main():
     edge_train_mode = args.mode
     print('edge train mode: {}'.format(edge_train_mode))
 
-    G = nx.read_gpickle(args.data_path)
-    print(G.number_of_edges())
-    print('Each node has node ID (n_id). Example: ', G.nodes[0])
-    print('Each edge has edge ID (id) and categorical label (e_label). Example: ', G[0][5871])
+    data = load_WN(args.data_path)
 
-    # find num edge types
-    max_label = 0
-    labels = []
-    for u, v, edge_key in G.edges:
-        l = G[u][v][edge_key]['e_label']
-        if not l in labels:
-            labels.append(l)
-    # labels are consecutive (0-17)
-    num_edge_types = len(labels)
-
-    H = WN_transform(G, num_edge_types)
-    # The nodes in the graph have the features: node_feature and node_type (just one node type "n1" here)
-    for node in H.nodes(data=True):
-        print(node)
-        break
-    # The edges in the graph have the features: edge_feature and edge_type ("0" - "17" here)
-    for edge in H.edges(data=True):
-        print(edge)
-        break
-
-    hetero = HeteroGraph(H)
-    hetero = HeteroGraph(
-        edge_index=hetero.edge_index,
-        edge_feature=hetero.edge_feature,
-        node_feature=hetero.node_feature,
-        directed=hetero.is_directed()
-    )
+    # find num edge types, labels are consecutive (0-17)
+    num_edge_types = len(torch.unique(data['label']))
+
+    # Just one node type "n1" and one message type per edge type ("0" - "17" here)
+    hetero = WN_transform(data, num_edge_types)
+    print(hetero)
 
     if edge_train_mode == "disjoint":
         dataset = GraphDataset(
@@ -233,27 +346,31 @@ def main():
     dataset_train, dataset_val, dataset_test = dataset.split(
         transductive=True, split_ratio=[0.8, 0.1, 0.1]
     )
-    train_loader = DataLoader(
-        dataset_train, collate_fn=Batch.collate(), batch_size=1
-    )
-    val_loader = DataLoader(
-        dataset_val, collate_fn=Batch.collate(), batch_size=1
-    )
-    test_loader = DataLoader(
-        dataset_test, collate_fn=Batch.collate(), batch_size=1
-    )
-    dataloaders = {
-        'train': train_loader, 'val': val_loader, 'test': test_loader
+    # Each split holds a single graph, so skip the DataLoader. The val and
+    # test splits never change and are collated and moved to device once.
+    adjs = {
+        split: sparse_adj(ds.graphs[0], args.device) for split, ds in
+        [('train', dataset_train), ('val', dataset_val), ('test', dataset_test)]
+    }
+    batches = {
+        'val': collate_split(dataset_val, adjs['val'], args.device),
+        'test': collate_split(dataset_test, adjs['test'], args.device),
     }
 
     hidden_size = args.hidden_dim
     conv1, conv2 = generate_2convs_link_pred_layers(hetero, HeteroSAGEConv, hidden_size)
     model = HeteroGNN(conv1, conv2, hetero, hidden_size).to(args.device)
+    if args.compile:
+        # Each split is a single graph, so the shapes are static and the
+        # small launch-bound kernels can be captured into CUDA graphs
+        model = torch.compile(model, mode='reduce-overhead', dynamic=False)
     optimizer = torch.optim.Adam(
         model.parameters(), lr=args.lr, weight_decay=args.weight_decay
     )
 
-    t_accu, v_accu, e_accu = train(model, dataloaders, optimizer, args)
+    t_accu, v_accu, e_accu = train(
+        model, dataset_train, adjs['train'], batches, optimizer, args
+    )
 
 
 if __name__ == '__main__':
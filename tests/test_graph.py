@@ -1,6 +1,7 @@
 import torch
 import unittest
 import numpy as np
+from unittest import mock
 from tests.utils import simple_networkx_graph
 from deepsnap.graph import Graph
 from torch_geometric.datasets import Planetoid
@@ -345,6 +346,61 @@ class TestGraph(unittest.TestCase):
             torch.all(dg.graph_feature.eq((dg_graph_feature + 10 + 100) * 2))
         )
 
+    def test_to_and_pin_memory(self):
+        G, x, y, edge_x, edge_y, edge_index, graph_x, graph_y = (
+            simple_networkx_graph()
+        )
+        Graph.add_edge_attr(G, "edge_feature", edge_x)
+        Graph.add_node_attr(G, "node_feature", x)
+        dg = Graph(G)
+        # dict-valued tensors as stored by the heterogeneous graph
+        dg["hetero_feature"] = {"n1": torch.ones(3, 2), "n2": torch.zeros(4)}
+
+        non_blocking = []
+        tensor_to = torch.Tensor.to
+
+        def to(tensor, *args, **kwargs):
+            non_blocking.append(kwargs.get("non_blocking"))
+            return tensor_to(tensor, *args, **kwargs)
+
+        with mock.patch.object(torch.Tensor, "to", to):
+            dg.to("cpu", "node_feature", "hetero_feature", non_blocking=True)
+        self.assertEqual(non_blocking, [True, True, True])
+
+        with mock.patch.object(torch.Tensor, "to", to):
+            non_blocking.clear()
+            dg.to("cpu", "node_feature")
+        self.assertEqual(non_blocking, [False])
+
+        pinned = []
+
+        def pin_memory(tensor):
+            pinned.append(id(tensor))
+            return tensor
+
+        tensors = [
+            dg.node_feature,
+            dg.edge_feature,
+            dg.hetero_feature["n1"],
+            dg.hetero_feature["n2"],
+        ]
+        with mock.patch.object(torch.Tensor, "pin_memory", pin_memory):
+            out = dg.pin_memory(
+                "node_feature", "edge_feature", "hetero_feature"
+            )
+        self.assertIs(out, dg)
+        self.assertEqual(
+            sorted(pinned), sorted(id(tensor) for tensor in tensors)
+        )
+
+        if not torch.cuda.is_available():
+            self.skipTest("pinned memory requires CUDA")
+        dg.pin_memory()
+        self.assertTrue(dg.node_feature.is_pinned())
+        self.assertTrue(dg.edge_feature.is_pinned())
+        self.assertTrue(dg.hetero_feature["n1"].is_pinned())
+        self.assertTrue(dg.hetero_feature["n2"].is_pinned())
+
     def test_repr(self):
         G, x, y, edge_x, edge_y, edge_index, graph_x, graph_y = (
             simple_networkx_graph()
@@ -3,7 +3,8 @@ import torch
 import unittest
 
 from torch import nn
-from deepsnap.hetero_gnn import forward_op
+from torch_sparse import SparseTensor
+from deepsnap.hetero_gnn import forward_op, HeteroSAGEConv
 
 class TestHeteroGNN(unittest.TestCase):
 
@@ -24,5 +25,39 @@ class TestHeteroGNN(unittest.TestCase):
             self.assertEqual(ys[key].shape[0], num_samples)
             self.assertEqual(ys[key].shape[1], emb_dim)
 
+    def test_hetero_sage_conv_sparse(self):
+        num_nodes = 6
+        feat_dim = 4
+        emb_dim = 8
+        # contains the self loop (2, 2)
+        edge_index = torch.tensor(
+            [[0, 1, 1, 2, 3, 4, 5, 5], [1, 0, 2, 2, 4, 3, 0, 1]]
+        )
+        adj_t = SparseTensor(
+            row=edge_index[1], col=edge_index[0],
+            sparse_sizes=(num_nodes, num_nodes)
+        )
+        x = torch.randn(num_nodes, feat_dim)
+
+        for aggr in ["add", "mean"]:
+            conv = HeteroSAGEConv(feat_dim, emb_dim, aggr=aggr)
+            out = conv(x, x, edge_index)
+            out_sparse = conv(x, x, adj_t)
+            self.assertEqual(out.shape, (num_nodes, emb_dim))
+            self.assertTrue(torch.allclose(out, out_sparse, atol=1e-6))
+
+        # without aggr, edge_index is summed and SparseTensor is averaged
+        conv = HeteroSAGEConv(feat_dim, emb_dim)
+        conv_add = HeteroSAGEConv(feat_dim, emb_dim, aggr="add")
+        conv_mean = HeteroSAGEConv(feat_dim, emb_dim, aggr="mean")
+        conv_add.load_state_dict(conv.state_dict())
+        conv_mean.load_state_dict(conv.state_dict())
+        self.assertTrue(
+            torch.allclose(conv(x, x, edge_index), conv_add(x, x, edge_index))
+        )
+        self.assertTrue(
+            torch.allclose(conv(x, x, adj_t), conv_mean(x, x, adj_t))
+        )
+
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    unittest.main()